@@ -4,6 +4,7 @@ import pandas as pd
 from .engine import (
     get_marketdata,
     download_marketdata,
+    download_templates,
     process_marketdata,
     CacheManager,
     process_etl,
@@ -1,11 +1,18 @@
 import argparse
 from datetime import datetime
+from functools import lru_cache
 
 from brasa.engine import CacheManager
 
-from . import download_marketdata, process_marketdata, process_etl, retrieve_template
+from . import download_templates, process_marketdata, process_etl, retrieve_template
 from .util import DateRangeParser
 
+
+@lru_cache(maxsize=4)
+def date_range_parser(calendar: str) -> DateRangeParser:
+    return DateRangeParser(calendar)
+
+
 parser = argparse.ArgumentParser()
 
 subparsers = parser.add_subparsers(dest="command", title="Commands")
@@ -37,11 +44,11 @@ if __name__ == "__main__":
         man = CacheManager()
     elif args.command == "download":
         if len(args.date) == 1:
-            date_range = DateRangeParser(args.calendar).parse(args.date[0])
+            date_range = date_range_parser(args.calendar).parse(args.date[0])
         else:
             date_range = [datetime.strptime(d, "%Y-%m-%d") for d in args.date]
-        for template in args.template:
-            download_marketdata(template, refdate=date_range)
+        # the dates of all templates are downloaded in parallel, in a single pool
+        download_templates(args.template, refdate=date_range)
     elif args.command == "process":
         for template in args.template:
             _template = retrieve_template(template)
@@ -1,16 +1,40 @@
-import binascii
+import base64
+import hashlib
+import io
 import os
 import os.path
 import logging
+import shutil
 import tempfile
 from typing import IO
 import zipfile
 from datetime import datetime, timedelta, date, timezone
 import json
-import bizdays
-import pytz
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from contextlib import contextmanager
+from functools import cached_property, partial
+from zoneinfo import ZoneInfo
+
+from ..util import generate_checksum_from_file, json_loads, load_calendar
+
+logger = logging.getLogger(__name__)
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504], raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# shared session: keeps connections to the same host alive across downloads
+_SESSION = _create_session()
+_SP_TZ = ZoneInfo("America/Sao_Paulo")
+_ANBIMA = load_calendar("ANBIMA")
 
 
 @contextmanager
@@ -23,6 +47,16 @@ def disable_ssl_warnings():
         yield None
 
 
+def download_url(url: str, verify_ssl: bool = True) -> tuple[str, IO | None, int, requests.Response]:
+    with disable_ssl_warnings():
+        res = _SESSION.get(url, verify=verify_ssl)
+    level = logging.WARNING if res.status_code != 200 else logging.INFO
+    logger.log(level, "status_code = %s url = %s", res.status_code, url)
+    if res.status_code != 200:
+        return url, None, res.status_code, res
+    return url, io.BytesIO(res.content), res.status_code, res
+
+
 class SimpleDownloader:
     def __init__(self, url, verify_ssl, **kwargs):
         self.verify_ssl = verify_ssl
@@ -39,18 +73,20 @@ class SimpleDownloader:
 
     def download(self) -> IO | None:
         with disable_ssl_warnings():
-            res = requests.get(self.url, verify=self.verify_ssl)
+            res = _SESSION.get(self.url, verify=self.verify_ssl, stream=True)
             self.response = res
 
-        msg = "status_code = {} url = {}".format(res.status_code, self.url)
-        logg = logging.warn if res.status_code != 200 else logging.info
-        logg(msg)
+        level = logging.WARNING if res.status_code != 200 else logging.INFO
+        logger.log(level, "status_code = %s url = %s", res.status_code, self.url)
 
         if res.status_code != 200:
+            res.close()
             return None
 
+        # the body is written to disk as it arrives instead of being loaded in memory
         temp = tempfile.TemporaryFile()
-        temp.write(res.content)
+        for chunk in res.iter_content(chunk_size=1 << 16):
+            temp.write(chunk)
         temp.seek(0)
         return temp
 
@@ -73,7 +109,7 @@ class B3URLEncodedDownloader(SimpleDownloader):
     @property
     def url(self) -> str:
         params = json.dumps(self.args)
-        params_enc = binascii.b2a_base64(bytes(params, "utf8"), newline=False).decode("utf8").strip()
+        params_enc = base64.b64encode(bytes(params, "utf8")).decode("utf8")
         return f"{self._url}/{params_enc}"
 
 
@@ -90,7 +126,7 @@ class B3PagedURLEncodedDownloader(B3URLEncodedDownloader):
 
     def download(self) -> IO | None:
         fp = super().download()
-        obj = json.load(fp)
+        obj = json_loads(fp.read())
         total_pages = obj["page"]["totalPages"]
         results = obj["results"]
         if len(results) == 0:
@@ -98,16 +134,13 @@ class B3PagedURLEncodedDownloader(B3URLEncodedDownloader):
         while self.page < total_pages:
             self.page += 1
             fp = super().download()
-            obj = json.load(fp)
+            obj = json_loads(fp.read())
             results.extend(obj["results"])
         data = {"results": results}
         if "header" in obj:
             data["header"] = obj["header"]
-        content = json.dumps(data)
-        temp = tempfile.TemporaryFile()
-        temp.write(bytes(content, "utf8"))
-        temp.seek(0)
-        return temp
+        # serialized with the json module, so the content and its checksum don't depend on orjson being installed
+        return io.BytesIO(json.dumps(data).encode("utf8"))
 
 
 class SettlementPricesDownloader(DatetimeDownloader):
@@ -123,20 +156,16 @@ class SettlementPricesDownloader(DatetimeDownloader):
             "dData1": self.refdate.strftime("%d/%m/%Y"),
         }
         with disable_ssl_warnings():
-            res = requests.post(self.url, params=body, verify=self.verify_ssl)
+            res = _SESSION.post(self.url, params=body, verify=self.verify_ssl)
             self.response = res
 
-        msg = "status_code = {} url = {}".format(res.status_code, self.url)
-        logg = logging.warn if res.status_code != 200 else logging.info
-        logg(msg)
+        level = logging.WARNING if res.status_code != 200 else logging.INFO
+        logger.log(level, "status_code = %s url = %s", res.status_code, self.url)
 
         if res.status_code != 200:
             return None
 
-        temp = tempfile.TemporaryFile()
-        temp.write(res.content)
-        temp.seek(0)
-        return temp
+        return io.BytesIO(res.content)
 
 
 class B3FilesURLDownloader(DatetimeDownloader):
@@ -148,7 +177,7 @@ class B3FilesURLDownloader(DatetimeDownloader):
         return f'https://arquivos.b3.com.br/api/download/?token={self._response1["token"]}'
 
     def download(self) -> IO | None:
-        res = requests.get(self.refdate.strftime(self._url))
+        res = _SESSION.get(self.refdate.strftime(self._url))
         self.response = res
         if res.status_code != 200:
             return None
@@ -157,17 +186,25 @@ class B3FilesURLDownloader(DatetimeDownloader):
 
 
 class PreparedURLDownloader(SimpleDownloader):
+    # parameters are split once: static values and datetime formats applied to each refdate
+    @cached_property
+    def _static_params(self) -> dict:
+        return {name: value for name, value in self.attrs["parameters"].items() if not isinstance(value, dict)}
+
+    @cached_property
+    def _datetime_params(self) -> list[tuple[str, str]]:
+        return [
+            (name, value["value"])
+            for name, value in self.attrs["parameters"].items()
+            if isinstance(value, dict) and value["type"] == "datetime"
+        ]
+
     def download(self, refdate=None):
         url = self.attrs["url"]
         refdate = refdate or self.now + timedelta(self.attrs.get("timedelta", 0))
-        params = {}
-        for param in self.attrs["parameters"]:
-            param_value = self.attrs["parameters"][param]
-            if isinstance(param_value, dict):
-                if param_value["type"] == "datetime":
-                    params[param] = refdate.strftime(param_value["value"])
-            else:
-                params[param] = param_value
+        params = dict(self._static_params)
+        for name, fmt in self._datetime_params:
+            params[name] = refdate.strftime(fmt)
 
         self._url = url.format(**params)
         fname, temp_file, status_code = self._download_unzip_historical_data(self._url)
@@ -184,24 +221,24 @@ class PreparedURLDownloader(SimpleDownloader):
         zf = zipfile.ZipFile(temp)
         nl = zf.namelist()
         if len(nl) == 0:
-            logging.error("zip file is empty url = {}".format(url))
+            logger.error("zip file is empty url = %s", url)
             return None, None, 204
         name = nl[0]
-        content = zf.read(name)  # bytes
+        content = tempfile.TemporaryFile()
+        with zf.open(name) as src:
+            shutil.copyfileobj(src, content, length=1 << 20)
+        content.seek(0)
         zf.close()
         temp.close()
-        temp = tempfile.TemporaryFile()
-        temp.write(content)
-        temp.seek(0)
-        return name, temp, status_code
+        return name, content, status_code
 
 
 class VnaAnbimaURLDownloader(SimpleDownloader):
-    calendar = bizdays.Calendar.load("ANBIMA")
+    calendar = _ANBIMA
 
     def download(self, refdate=None):
         refdate = refdate or self.get_refdate()
-        logging.info("refdate %s", refdate)
+        logger.info("refdate %s", refdate)
         url = "https://www.anbima.com.br/informacoes/vna/vna.asp"
         body = {
             "Data": refdate.strftime("%d%m%Y"),
@@ -211,18 +248,15 @@ class VnaAnbimaURLDownloader(SimpleDownloader):
             "Dt_Ref_Ver": refdate.strftime("%Y%m%d"),
             "Inicio": refdate.strftime("%d/%m/%Y"),
         }
-        res = requests.post(url, params=body)
-        msg = "status_code = {} url = {}".format(res.status_code, url)
-        logg = logging.warn if res.status_code != 200 else logging.info
-        logg(msg)
+        res = _SESSION.post(url, params=body)
+        level = logging.WARNING if res.status_code != 200 else logging.INFO
+        logger.log(level, "status_code = %s url = %s", res.status_code, url)
         if res.status_code != 200:
             return None, None, res.status_code, refdate
         status_code = res.status_code
-        temp_file = tempfile.TemporaryFile()
-        temp_file.write(res.content)
-        temp_file.seek(0)
+        temp_file = io.BytesIO(res.content)
         f_fname = self.get_fname(None, refdate)
-        logging.info(
+        logger.info(
             "Returned from download %s %s %s %s",
             f_fname,
             temp_file,
@@ -234,20 +268,19 @@ class VnaAnbimaURLDownloader(SimpleDownloader):
     def get_refdate(self):
         offset = self.attrs.get("offset", 0)
         refdate = self.calendar.offset(self.now, offset)
-        refdate = datetime(refdate.year, refdate.month, refdate.day)
-        refdate = pytz.timezone("America/Sao_Paulo").localize(refdate)
+        refdate = datetime(refdate.year, refdate.month, refdate.day, tzinfo=_SP_TZ)
         return refdate
 
 
 def download_by_config(config_data, save_func, refdate=None):
-    logging.info("content size = %d", len(config_data))
-    config = json.loads(config_data)
-    logging.info("content = %s", config)
+    logger.info("content size = %d", len(config_data))
+    config = json_loads(config_data)
+    logger.info("content = %s", config)
     downloader = downloader_factory(**config)
     download_time = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f%z")
-    logging.info("Download weekdays %s", config.get("download_weekdays"))
+    logger.info("Download weekdays %s", config.get("download_weekdays"))
     if config.get("download_weekdays") and downloader.now.weekday() not in config.get("download_weekdays"):
-        logging.info(
+        logger.info(
             "Not a date to download. Weekday %s Download Weekdays %s",
             downloader.now.weekday(),
             config.get("download_weekdays"),
@@ -267,11 +300,14 @@ def download_by_config(config_data, save_func, refdate=None):
         }
     try:
         fname, tfile, status_code, refdate = downloader.download(refdate=refdate)
-        logging.info("Download time (UTC) %s", download_time)
-        logging.info("Refdate %s", refdate)
+        logger.info("Download time (UTC) %s", download_time)
+        logger.info("Refdate %s", refdate)
         if status_code == 200:
-            save_func(config, fname, tfile)
-            msg = "File saved"
+            # save_func returns False when the file is identical to the one previously saved
+            if save_func(config, fname, tfile) is False:
+                msg = "File unchanged"
+            else:
+                msg = "File saved"
             status = 0
         else:
             msg = "File not saved"
@@ -287,7 +323,7 @@ def download_by_config(config_data, save_func, refdate=None):
             "time": download_time,
         }
     except Exception as ex:
-        logging.error(str(ex))
+        logger.error("%s", ex)
         return {
             "message": str(ex),
             "download_status": -1,
@@ -300,9 +336,19 @@ def download_by_config(config_data, save_func, refdate=None):
         }
 
 
-def save_file_to_temp_folder(attrs, fname, tfile):
+def save_file_to_temp_folder(attrs, fname, tfile) -> bool:
     fname = "/tmp/{}".format(fname)
-    logging.info("saving file %s", fname)
+    checksum = generate_checksum_from_file(tfile, partial(hashlib.blake2b, digest_size=16))
+    checksum_fname = "{}.hash".format(fname)
+    if os.path.exists(fname) and os.path.exists(checksum_fname):
+        with open(checksum_fname, "r") as f:
+            if f.read() == checksum:
+                logger.info("file %s unchanged", fname)
+                return False
+    logger.info("saving file %s", fname)
     os.makedirs(os.path.dirname(fname), exist_ok=True)
-    with open(fname, "wb") as f:
-        f.write(tfile.read())
+    with open(fname, "wb", buffering=1 << 20) as f:
+        shutil.copyfileobj(tfile, f, length=1 << 16)
+    with open(checksum_fname, "w") as f:
+        f.write(checksum)
+    return True
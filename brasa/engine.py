@@ -1,5 +1,6 @@
 import abc
 import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import gzip
 import io
@@ -9,6 +10,7 @@ from pathlib import Path
 import re
 import shutil
 import sqlite3
+import tempfile
 from typing import IO, Any, Callable
 from warnings import warn
 from numpy import empty
@@ -20,6 +22,9 @@ import regexparser
 
 from .util import KwargsIterator, generate_checksum_for_template, generate_checksum_from_file, unzip_recursive
 
+# maximum number of simultaneous downloads - bounds the requests sent to B3/ANBIMA servers
+DOWNLOAD_MAX_WORKERS = 16
+
 
 def json_convert_from_object(obj):
     if isinstance(obj, datetime):
@@ -395,7 +400,7 @@ class CacheManager(Singleton):
         return folder
 
     def create_download_folder(self, meta: CacheMetadata):
-        os.makedirs(self.cache_path(meta.download_folder), exist_ok=True)
+        os.makedirs(self.cache_path(meta.download_folder), exist_ok=False)
 
     @property
     def meta_db_filename(self) -> str:
@@ -573,11 +578,13 @@ def _download_marketdata(meta: CacheMetadata, **kwargs):
     checksum = generate_checksum_from_file(fp)
     meta.download_checksum = checksum
     man = CacheManager()
-    if os.path.exists(man.cache_path(meta.download_folder)):
-        raise DownloadException(f"Market data download failed: download folder {meta.download_folder} already exists")
-    # DownloadException must be raised before creating download folder
+    # downloads running in other threads can return the same content, so the folder is created with
+    # exist_ok=False instead of checking for it first - the check and the creation were not atomic
     # after this any exception can be raised and it will clean up the download folder
-    man.create_download_folder(meta)
+    try:
+        man.create_download_folder(meta)
+    except FileExistsError:
+        raise DownloadException(f"Market data download failed: download folder {meta.download_folder} already exists")
 
     fname = f"downloaded.{template.downloader.format}"
     file_rel_path = os.path.join(meta.download_folder, fname)
@@ -588,14 +595,20 @@ def _download_marketdata(meta: CacheMetadata, **kwargs):
 
     downloaded_files = []
     if template.downloader.format == "zip":
-        filenames = unzip_recursive(man.cache_path(file_rel_path))
-        if len(filenames) == 0:
-            raise Exception("Market data download failed: empty zip file")
-        for filename in filenames:
-            fname = os.path.basename(filename)
-            _file_rel_path = os.path.join(meta.download_folder, fname)
-            shutil.move(filename, man.cache_path(_file_rel_path))
-            downloaded_files.append(_file_rel_path)
+        # each download is extracted into its own folder, downloads running in other threads
+        # usually have members with the same name
+        temp_dir = tempfile.mkdtemp()
+        try:
+            filenames = unzip_recursive(man.cache_path(file_rel_path), temp_dir)
+            if len(filenames) == 0:
+                raise Exception("Market data download failed: empty zip file")
+            for filename in filenames:
+                fname = os.path.basename(filename)
+                _file_rel_path = os.path.join(meta.download_folder, fname)
+                shutil.move(filename, man.cache_path(_file_rel_path))
+                downloaded_files.append(_file_rel_path)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
         os.remove(man.cache_path(file_rel_path))
     elif template.downloader.format == "base64":
         with open(man.cache_path(file_rel_path), "rb") as fp:
@@ -627,8 +640,7 @@ def _download_marketdata(meta: CacheMetadata, **kwargs):
         meta.downloaded_files.remove(fname)
 
 
-def get_fname_part(meta: CacheMetadata, df: pd.DataFrame) -> str:
-    template = retrieve_template(meta.template)
+def get_fname_part(meta: CacheMetadata, template: MarketDataTemplate, df: pd.DataFrame) -> str:
     fmt = template.reader.output_filename_format
     if "refdate" in meta.download_args:
         fname_part = meta.download_args["refdate"].strftime(fmt)
@@ -647,9 +659,11 @@ def get_fname_part(meta: CacheMetadata, df: pd.DataFrame) -> str:
     return fname_part
 
 
-def save_parquet_file(meta: CacheMetadata, folder: str, processed_files_name: str, df: pd.DataFrame) -> None:
+def save_parquet_file(
+    meta: CacheMetadata, template: MarketDataTemplate, folder: str, processed_files_name: str, df: pd.DataFrame
+) -> None:
     man = CacheManager()
-    fname_part = get_fname_part(meta, df)
+    fname_part = get_fname_part(meta, template, df)
     fname = os.path.join(folder, man.parquet_file_name(fname_part))
     meta.processed_files[processed_files_name] = fname
     df.to_parquet(man.cache_path(fname))
@@ -663,9 +677,9 @@ def _read_marketdata(meta: CacheMetadata) -> None:
     if isinstance(df, dict) and isinstance(db_folder, dict):
         for name, dx in df.items():
             if dx.shape[0] > 0:
-                save_parquet_file(meta, db_folder[name], template.reader.multi[name], dx)
+                save_parquet_file(meta, template, db_folder[name], template.reader.multi[name], dx)
     elif isinstance(df, pd.DataFrame) and isinstance(db_folder, str):
-        save_parquet_file(meta, db_folder, "data", df)
+        save_parquet_file(meta, template, db_folder, "data", df)
 
 
 def get_marketdata(
@@ -697,18 +711,12 @@ def get_marketdata(
             return get_marketdata(template_name, reprocess=True, **kwargs)
 
 
-def download_marketdata(template_name: str, reprocess: bool = False, **kwargs) -> None:
+def _pending_downloads(template_name: str, reprocess: bool = False, **kwargs) -> list[CacheMetadata]:
     template = retrieve_template(template_name)
     cache = CacheManager()
     kwargs_iter = KwargsIterator(kwargs)
-    widgets = [
-        f"D {template_name} ",
-        progressbar.SimpleProgress(format="%(value_s)3s/%(max_value_s)-3s"),
-        progressbar.Bar(),
-        " ",
-        progressbar.Timer(),
-    ]
-    for args in progressbar.progressbar(kwargs_iter, max_value=len(kwargs_iter), widgets=widgets):
+    metas = []
+    for args in kwargs_iter:
         meta = CacheMetadata(template.id)
         meta.extra_key = template.downloader.extra_key
         meta.download_args = args
@@ -718,15 +726,57 @@ def download_marketdata(template_name: str, reprocess: bool = False, **kwargs) -
             if cache.has_meta(meta):
                 cache.load_meta(meta)
                 cache.remove_meta(meta)
-            cache.download_marketdata(meta)
+            metas.append(meta)
         else:
             if cache.has_meta(meta):
                 cache.load_meta(meta)
                 check = all([os.path.exists(cache.cache_path(f)) for f in meta.downloaded_files])
                 if not check:
-                    cache.download_marketdata(meta)
+                    metas.append(meta)
             else:
-                cache.download_marketdata(meta)
+                metas.append(meta)
+    return metas
+
+
+def _run_downloads(metas: list[CacheMetadata], label: str) -> None:
+    cache = CacheManager()
+    widgets = [
+        f"D {label} ",
+        progressbar.SimpleProgress(format="%(value_s)3s/%(max_value_s)-3s"),
+        progressbar.Bar(),
+        " ",
+        progressbar.Timer(),
+    ]
+    # downloads are I/O bound and independent from each other, so they run in a thread pool
+    with progressbar.ProgressBar(max_value=len(metas), widgets=widgets) as pbar:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_MAX_WORKERS) as executor:
+            futures = [executor.submit(cache.download_marketdata, meta) for meta in metas]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    pbar.update(pbar.value + 1)
+            except BaseException:
+                # stops at the first error or Ctrl-C, as the serial loop did - only running downloads are awaited
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+
+def download_marketdata(template_name: str, reprocess: bool = False, **kwargs) -> None:
+    metas = _pending_downloads(template_name, reprocess, **kwargs)
+    _run_downloads(metas, template_name)
+
+
+def download_templates(template_names: list[str], reprocess: bool = False, **kwargs) -> None:
+    """Downloads market data for many templates at once.
+
+    The downloads of all templates share the same thread pool and progress bar,
+    so no more than DOWNLOAD_MAX_WORKERS requests are sent at the same time.
+    """
+    metas = []
+    for template_name in template_names:
+        metas.extend(_pending_downloads(template_name, reprocess, **kwargs))
+    label = template_names[0] if len(template_names) == 1 else f"{len(template_names)} templates"
+    _run_downloads(metas, label)
 
 
 def process_marketdata(template_name: str, reprocess: bool = False) -> None:
@@ -2,7 +2,6 @@
 from datetime import datetime
 import io
 from typing import IO
-import numpy as np
 
 import pandas as pd
 from lxml import etree
@@ -83,10 +82,6 @@ def future_settlement_prices_parser(fname: IO | str) -> pd.DataFrame:
     tree = etree.parse(fname, etree.HTMLParser())
     refdate_str = tree.xpath(f"//input[@id='dData1']")[0].attrib["value"]
     df["refdate"] = pd.to_datetime(refdate_str, format="%d/%m/%Y")
-    for ix in range(df.shape[0]):
-        if df.loc[ix, "commodity"] is not np.nan:
-            last_name = df.loc[ix, "commodity"]
-        df.loc[ix, "commodity"] = last_name
-    df.loc[:, "commodity"] = df.loc[:, "commodity"].str.extract(r"^(\w+)")[0]
+    df["commodity"] = df["commodity"].ffill().str.extract(r"^(\w+)")[0]
     df["symbol"] = df["commodity"] + df["maturity_code"]
     return df
\ No newline at end of file
@@ -2,6 +2,7 @@ import re
 from datetime import datetime
 from collections import OrderedDict
 
+import numpy as np
 import pandas as pd
 
 
@@ -106,6 +107,27 @@ class FWFRow(metaclass=FWFRowMeta):
     def __len__(self):
         return self.row_len
 
+    def parse_lines(self, lines: list[str]) -> pd.DataFrame:
+        """Splits lines into columns and parses them.
+
+        Lines are loaded into a NumPy array of characters (one row per line),
+        so each field is sliced and stripped for all lines at once.
+        Lines are truncated or padded to the row length.
+        """
+        lines = [line[: self.row_len].ljust(self.row_len) for line in lines]
+        try:
+            # one byte per character when the text fits in latin1, as in B3 files
+            codes = np.frombuffer("".join(lines).encode("latin1"), dtype=np.uint8)
+        except UnicodeEncodeError:
+            codes = np.array(lines, dtype=f"U{self.row_len}").view(np.uint32)
+        codes = codes.reshape(-1, self.row_len)
+        columns = {}
+        for name, (start, end, parse) in zip(self.names, self.colpositions):
+            # the code points of a field are widened to UCS4 and read as strings
+            values = np.ascontiguousarray(codes[:, start:end], dtype=np.uint32).view(f"U{end - start}").ravel()
+            columns[name] = parse(pd.Series(np.char.strip(values), dtype=object))
+        return pd.DataFrame(columns)
+
 
 class FWFFileMeta(type):
     """The metaclass for the FWFRow class. We use the metaclass to sort of
@@ -118,7 +140,6 @@ class FWFFileMeta(type):
         """
         cls = type.__new__(meta, name, bases, attrs)
         cls._rows = [(k, v) for k, v in attrs.items() if isinstance(v, FWFRow)]
-        cls._buckets = dict((r[0], []) for r in cls._rows)
         return cls
 
 
@@ -130,8 +151,7 @@ class FWFFile(metaclass=FWFFileMeta):
             fp = open(fname, "r", encoding=encoding)
         else:
             fp = fname
-        for nx in self._buckets:
-            self._buckets[nx] = []
+        buckets = dict((r[0], []) for r in self._rows)
         for ix, line in enumerate(fp):
             if isinstance(line, bytes):
                 line = line.decode(encoding)
@@ -140,26 +160,16 @@ class FWFFile(metaclass=FWFFileMeta):
             row_name, row_template = self._get_row_template(line)
             # TODO: define policy to discard unmatched lines and
             #       lines with parsing errors
-            # if len(line) < len(row_template):
-            #     continue
-            # fields = [
-            #     dx[2](line[dx[0]: dx[1]].strip())
-            #     for dx in row_template.colpositions
-            # ]
-            fields = [line[dx[0] : dx[1]].strip() for dx in row_template.colpositions]
-            obj = dict((k, v) for k, v in zip(row_template.names, fields))
-            self._buckets[row_name].append(obj)
-        self._tables = {n: pd.DataFrame(b) for n, b in self._buckets.items()}
-        for row_name, row_template in self._rows:
-            for fn, f in row_template._fields.items():
-                self._tables[row_name][fn] = f.parse(self._tables[row_name][fn])
+            buckets[row_name].append(line)
+        self._tables = {row_name: row_template.parse_lines(buckets[row_name]) for row_name, row_template in self._rows}
         if isinstance(fname, str):
             fp.close()
 
     def __getattribute__(self, name: str):
-        buckets = super(FWFFile, self).__getattribute__("_buckets")
-        if name in buckets:
-            return buckets[name]
+        # row names return the parsed tables, as in parser.data
+        tables = super(FWFFile, self).__getattribute__("__dict__").get("_tables", {})
+        if name in tables:
+            return tables[name]
         else:
             return super(FWFFile, self).__getattribute__(name)
 
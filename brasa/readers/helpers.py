@@ -1,9 +1,17 @@
+from functools import lru_cache
+import glob
 import gzip
+import hashlib
 import json
-from typing import IO
+import mmap
+import os
+import tempfile
+from typing import IO, Any, Callable
+from warnings import warn
 
 import numpy as np
 import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
 
 from ..engine import CacheManager, CacheMetadata, MarketDataReader, retrieve_template
 from ..parsers.b3.bvbg028 import BVBG028Parser
@@ -13,15 +21,84 @@ from ..parsers.b3.cdi import CDIParser
 from ..parsers.b3.cotahist import COTAHISTParser
 from ..parsers.b3.indic import IndicParser
 from ..parsers.b3.futures_settlement_prices import future_settlement_prices_parser
-from ..util import SuppressUserWarnings
+from ..util import SuppressUserWarnings, json_loads
+
+
+def _parse_cache_size() -> int:
+    value = os.environ.get("BRASA_PARSE_CACHE_SIZE", "0")
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        warn(f"Invalid BRASA_PARSE_CACHE_SIZE {value!r}: parse cache disabled")
+        return 0
+
+
+# parsed tables are cached only when BRASA_PARSE_CACHE_SIZE is set, e.g. for interactive use -
+# batch processing reads each file once and a cache would only hold memory
+_PARSE_CACHE_SIZE = _parse_cache_size()
+
+
+def _parser_data(parser: Any) -> Any:
+    return parser.data
+
+
+def _cotahist_data(parser: COTAHISTParser) -> pd.DataFrame:
+    return parser._data._tables["data"]
+
+
+def _copy_tables(tables: Any) -> Any:
+    if isinstance(tables, dict):
+        return {k: df.copy() for k, df in tables.items()}
+    return tables.copy()
+
+
+def _parse_file(
+    path: str, mtime: int, size: int, parser: Callable[[IO], Any], extract: Callable[[Any], Any] | None
+) -> Any:
+    # the compressed file is memory mapped and decompressed from the page cache
+    with open(path, "rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        with gzip.GzipFile(fileobj=mm, mode="rb") as f:
+            obj = parser(f)
+    # only the extracted tables are kept, the parser object is released
+    return extract(obj) if extract else obj
+
+
+_cached_parse = lru_cache(maxsize=_PARSE_CACHE_SIZE)(_parse_file)
+
+
+def _parse_gzip_file(path: str, parser: Callable[[IO], Any], extract: Callable[[Any], Any] | None = None) -> Any:
+    """Parses a gzipped file in the cache folder and returns the tables selected by `extract`.
+
+    When the parse cache is enabled, the tables are cached by path, modification
+    time and size, so the file is parsed again only when it changes, and copies
+    are returned, so readers can modify them in place.
+    """
+    s = os.stat(path)
+    tables = _cached_parse(path, s.st_mtime_ns, s.st_size, parser, extract)
+    return _copy_tables(tables) if _PARSE_CACHE_SIZE else tables
+
+
+def _text_columns_args(names: list[str], text_columns: list[str]) -> dict[str, Any]:
+    """Returns the read_csv arguments that read `text_columns` as strings.
+
+    Empty and NA cells of these columns are kept as read, as with
+    ``converters={col: str}``; ``dtype=str`` alone would turn them into NaN.
+    """
+    return dict(
+        dtype={name: str for name in text_columns},
+        keep_default_na=False,
+        na_values={name: STR_NA_VALUES for name in names if name not in text_columns},
+    )
 
 
 def read_json(reader: MarketDataReader, fname: IO | str) -> pd.DataFrame:
     if isinstance(fname, str):
         with open(fname, "r", encoding=reader.encoding) as f:
-            data = json.load(f)
+            data = json_loads(f.read())
     else:
-        data = json.load(fname)
+        data = json_loads(fname.read())
     return pd.DataFrame(data, index=[0], columns=reader.fields.names)
 
 
@@ -31,18 +108,15 @@ def read_b3_trades_intraday(meta: CacheMetadata) -> pd.DataFrame:
     fname = man.cache_path(fname)
     template = retrieve_template(meta.template)
     reader = template.reader
-    converters = {
-        "trade_time": str,
-    }
     df = pd.read_csv(
         fname,
         encoding=reader.encoding,
         header=None,
         skiprows=reader.skip,
         sep=reader.separator,
-        converters=converters,
         names=reader.fields.names,
         dtype_backend="pyarrow",
+        **_text_columns_args(reader.fields.names, ["trade_time"]),
     )
 
     df["traded_quantity"] = pd.to_numeric(df["traded_quantity"], errors="coerce")
@@ -109,9 +183,7 @@ def read_b3_lending_trades(meta: CacheMetadata) -> pd.DataFrame:
 def read_b3_cotahist(meta: CacheMetadata) -> pd.DataFrame:
     fname = meta.downloaded_files[0]
     man = CacheManager()
-    with gzip.open(man.cache_path(fname)) as f:
-        parser = COTAHISTParser(f)
-    return parser._data._tables["data"]
+    return _parse_gzip_file(man.cache_path(fname), COTAHISTParser, _cotahist_data)
 
 
 def read_b3_economic_indicators_fwf(meta: CacheMetadata) -> pd.DataFrame:
@@ -129,10 +201,9 @@ def read_b3_bvbg028(meta: CacheMetadata) -> dict[str, pd.DataFrame]:
     paths.sort()
     fname = paths[-1]
     man = CacheManager()
-    with gzip.open(man.cache_path(fname)) as f:
-        parser = BVBG028Parser(f)
+    data = _parse_gzip_file(man.cache_path(fname), BVBG028Parser, _parser_data)
 
-    df_equities = parser.data["EqtyInf"]
+    df_equities = data["EqtyInf"]
     df_equities["creation_date"] = pd.to_datetime(df_equities["creation_date"])
     df_equities["refdate"] = pd.to_datetime(df_equities["refdate"])
     df_equities["security_id"] = pd.to_numeric(df_equities["security_id"])
@@ -158,7 +229,7 @@ def read_b3_bvbg028(meta: CacheMetadata) -> dict[str, pd.DataFrame]:
             df_equities["corporate_action_start_date"], errors="coerce"
         )
 
-    df_futures = parser.data["FutrCtrctsInf"]
+    df_futures = data["FutrCtrctsInf"]
     df_futures["creation_date"] = pd.to_datetime(df_futures["creation_date"])
     df_futures["refdate"] = pd.to_datetime(df_futures["refdate"])
     df_futures["security_id"] = pd.to_numeric(df_futures["security_id"])
@@ -182,7 +253,7 @@ def read_b3_bvbg028(meta: CacheMetadata) -> dict[str, pd.DataFrame]:
         df_futures["trading_start_date"] = pd.to_datetime(df_futures["trading_start_date"], errors="coerce")
         df_futures["trading_end_date"] = pd.to_datetime(df_futures["trading_end_date"], errors="coerce")
 
-    df_eq_options = parser.data["OptnOnEqtsInf"]
+    df_eq_options = data["OptnOnEqtsInf"]
     df_eq_options["creation_date"] = pd.to_datetime(df_eq_options["creation_date"])
     df_eq_options["refdate"] = pd.to_datetime(df_eq_options["refdate"])
     df_eq_options["security_id"] = pd.to_numeric(df_eq_options["security_id"])
@@ -208,7 +279,84 @@ def read_b3_bvbg028(meta: CacheMetadata) -> dict[str, pd.DataFrame]:
         df_eq_options["trading_start_date"] = pd.to_datetime(df_eq_options["trading_start_date"], errors="coerce")
         df_eq_options["trading_end_date"] = pd.to_datetime(df_eq_options["trading_end_date"], errors="coerce")
 
-    return parser.data
+    return data
+
+
+# bump when BVBG086Parser or _coerce_bvbg086 change the output, so stored sidecars are not reused
+_BVBG086_SIDECAR_VERSION = 1
+_BVBG086_DATE_COLUMNS = ["refdate", "creation_date"]
+_BVBG086_NUMERIC_COLUMNS = [
+    "security_id",
+    "security_proprietary",
+    "open_interest",
+    "trade_quantity",
+    "volume",
+    "traded_contracts",
+    "best_ask_price",
+    "best_bid_price",
+    "open",
+    "low",
+    "high",
+    "average",
+    "close",
+    "regular_transactions_quantity",
+    "regular_traded_contracts",
+    "regular_volume",
+    "oscillation_percentage",
+    "adjusted_quote",
+    "adjusted_tax",
+    "previous_adjusted_quote",
+    "previous_adjusted_tax",
+    "variation_points",
+    "adjusted_value_contract",
+    "nonregular_transactions_quantity",
+    "nonregular_traded_contracts",
+    "nonregular_volume",
+]
+
+
+def _coerce_bvbg086(df: pd.DataFrame) -> pd.DataFrame:
+    df[_BVBG086_DATE_COLUMNS] = df[_BVBG086_DATE_COLUMNS].apply(pd.to_datetime, format="ISO8601", cache=True)
+    df["adjusted_value_contract"] = df["adjusted_value_contract"].str.replace(",", ".")
+    df[_BVBG086_NUMERIC_COLUMNS] = df[_BVBG086_NUMERIC_COLUMNS].apply(pd.to_numeric)
+    return df
+
+
+def _read_bvbg086_file(path: str) -> pd.DataFrame:
+    """Reads a gzipped BVBG.086 file and coerces its columns.
+
+    The coerced data is stored in a parquet file next to the raw file and
+    reused while the raw file, the parser and the coercion don't change.
+    A sidecar that can't be read is parsed again and replaced.
+    """
+    s = os.stat(path)
+    key = f"{_BVBG086_SIDECAR_VERSION}:{path}:{s.st_mtime_ns}:{s.st_size}"
+    key = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+    folder = os.path.dirname(path)
+    sidecar_path = os.path.join(folder, f"bvbg086_{key}.parquet")
+    if os.path.exists(sidecar_path):
+        try:
+            return pd.read_parquet(sidecar_path, engine="pyarrow")
+        except (OSError, ValueError):
+            pass
+
+    df = _coerce_bvbg086(_parse_gzip_file(path, BVBG086Parser, _parser_data))
+
+    # written to a temporary name first, so a failed write never leaves a truncated sidecar behind
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", prefix="bvbg086_", dir=folder)
+    os.close(fd)
+    try:
+        df.to_parquet(temp_path, engine="pyarrow", compression="zstd")
+        os.replace(temp_path, sidecar_path)
+    except OSError:
+        pass
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    for fname in glob.glob(os.path.join(folder, "bvbg086_*.parquet")):
+        if fname != sidecar_path:
+            os.remove(fname)
+    return df
 
 
 def read_b3_bvbg086(meta: CacheMetadata) -> pd.DataFrame:
@@ -216,39 +364,7 @@ def read_b3_bvbg086(meta: CacheMetadata) -> pd.DataFrame:
     paths.sort()
     fname = paths[-1]
     man = CacheManager()
-    with gzip.open(man.cache_path(fname)) as f:
-        parser = BVBG086Parser(f)
-    df = parser.data
-    df["refdate"] = pd.to_datetime(df["refdate"])
-    df["creation_date"] = pd.to_datetime(df["creation_date"])
-    df["security_id"] = pd.to_numeric(df["security_id"])
-    df["security_proprietary"] = pd.to_numeric(df["security_proprietary"])
-    df["open_interest"] = pd.to_numeric(df["open_interest"])
-    df["trade_quantity"] = pd.to_numeric(df["trade_quantity"])
-    df["volume"] = pd.to_numeric(df["volume"])
-    df["traded_contracts"] = pd.to_numeric(df["traded_contracts"])
-    df["best_ask_price"] = pd.to_numeric(df["best_ask_price"])
-    df["best_bid_price"] = pd.to_numeric(df["best_bid_price"])
-    df["open"] = pd.to_numeric(df["open"])
-    df["low"] = pd.to_numeric(df["low"])
-    df["high"] = pd.to_numeric(df["high"])
-    df["average"] = pd.to_numeric(df["average"])
-    df["close"] = pd.to_numeric(df["close"])
-    df["regular_transactions_quantity"] = pd.to_numeric(df["regular_transactions_quantity"])
-    df["regular_traded_contracts"] = pd.to_numeric(df["regular_traded_contracts"])
-    df["regular_volume"] = pd.to_numeric(df["regular_volume"])
-    df["oscillation_percentage"] = pd.to_numeric(df["oscillation_percentage"])
-    df["adjusted_quote"] = pd.to_numeric(df["adjusted_quote"])
-    df["adjusted_tax"] = pd.to_numeric(df["adjusted_tax"])
-    df["previous_adjusted_quote"] = pd.to_numeric(df["previous_adjusted_quote"])
-    df["previous_adjusted_tax"] = pd.to_numeric(df["previous_adjusted_tax"])
-    df["variation_points"] = pd.to_numeric(df["variation_points"])
-    df["adjusted_value_contract"] = pd.to_numeric(df["adjusted_value_contract"].str.replace(",", "."))
-    df["nonregular_transactions_quantity"] = pd.to_numeric(df["nonregular_transactions_quantity"])
-    df["nonregular_traded_contracts"] = pd.to_numeric(df["nonregular_traded_contracts"])
-    df["nonregular_volume"] = pd.to_numeric(df["nonregular_volume"])
-
-    return parser.data
+    return _read_bvbg086_file(man.cache_path(fname))
 
 
 def read_b3_bvbg087(meta: CacheMetadata) -> dict[str, pd.DataFrame]:
@@ -301,16 +417,13 @@ def read_b3_bvbg087(meta: CacheMetadata) -> dict[str, pd.DataFrame]:
 
 def read_b3_cdi(meta: CacheMetadata) -> pd.DataFrame:
     man = CacheManager()
-    parser = CDIParser(man.cache_path(meta.downloaded_files[0]))
-    return parser.data
+    return _parse_gzip_file(man.cache_path(meta.downloaded_files[0]), CDIParser, _parser_data)
 
 
 def read_b3_futures_settlement_prices(meta: CacheMetadata) -> pd.DataFrame:
     fname = meta.downloaded_files[-1]
     man = CacheManager()
-    with gzip.open(man.cache_path(fname)) as f:
-        df = future_settlement_prices_parser(f)
-    return df
+    return _parse_gzip_file(man.cache_path(fname), future_settlement_prices_parser)
 
 
 def read_b3_economic_indicators_price(meta: CacheMetadata) -> pd.DataFrame:
@@ -319,18 +432,15 @@ def read_b3_economic_indicators_price(meta: CacheMetadata) -> pd.DataFrame:
     fname = man.cache_path(fname)
     template = retrieve_template(meta.template)
     reader = template.reader
-    converters = {
-        "refdate": str,
-    }
     df = pd.read_csv(
         fname,
         encoding=reader.encoding,
         header=None,
         skiprows=reader.skip,
         sep=reader.separator,
-        converters=converters,
         names=reader.fields.names,
         dtype_backend="pyarrow",
+        **_text_columns_args(reader.fields.names, ["refdate"]),
     )
 
     df["price"] = pd.to_numeric(df["price"].str.replace(",", "."), errors="coerce")
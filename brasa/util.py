@@ -1,22 +1,42 @@
 from datetime import datetime
+from functools import lru_cache
 import hashlib
 import itertools
+import json
 import logging
 import os
 import pickle
 import warnings
 import zipfile
 from tempfile import gettempdir
-from typing import IO
+from typing import IO, Any, Callable
 
 from bizdays import Calendar
 from bizdays import set_option
 from regexparser import TextParser
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 set_option("mode.datetype", "datetime")
 
 
+@lru_cache(maxsize=8)
+def load_calendar(name: str) -> Calendar:
+    """Loads a bizdays calendar once and reuses it in subsequent calls."""
+    return Calendar.load(name)
+
+
+def json_loads(data: bytes | str) -> Any:
+    """Parses JSON with orjson, when it is installed, or with the json module."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 class SuppressUserWarnings:
     def __enter__(self):
         warnings.filterwarnings("ignore", category=UserWarning)
@@ -37,8 +57,8 @@ def generate_checksum_for_template(template: str, args: dict, extra_key: str = "
     return hashlib.md5(pickle.dumps(obj)).hexdigest()
 
 
-def generate_checksum_from_file(fp: IO) -> str:
-    file_hash = hashlib.md5()
+def generate_checksum_from_file(fp: IO, hash_constructor: Callable[[], Any] = hashlib.md5) -> str:
+    file_hash = hash_constructor()
     while chunk := fp.read(8192):
         file_hash.update(chunk)
     fp.seek(0)
@@ -55,13 +75,14 @@ def unzip_file_to(fname, dest) -> list:
     return [os.path.join(dest, name) for name in names]
 
 
-def unzip_recursive(fname):
+def unzip_recursive(fname, dest=None):
+    dest = dest or gettempdir()
     if isinstance(fname, str) and fname.lower().endswith(".zip"):
-        fname = unzip_file_to(fname, gettempdir())
-        return unzip_recursive(fname)
+        fname = unzip_file_to(fname, dest)
+        return unzip_recursive(fname, dest)
     elif isinstance(fname, list) and len(fname) == 1 and fname[0].lower().endswith(".zip"):
-        fname = unzip_file_to(fname[0], gettempdir())
-        return unzip_recursive(fname)
+        fname = unzip_file_to(fname[0], dest)
+        return unzip_recursive(fname, dest)
     else:
         return fname
 
@@ -117,7 +138,7 @@ class DateRange:
         if start is None and year is None:
             raise ValueError("Either start or year must be specified")
 
-        self.calendar = Calendar() if calendar is None else Calendar.load(calendar)
+        self.calendar = Calendar() if calendar is None else load_calendar(calendar)
         if start is not None:
             start = self.calendar.following(start)
         if start is not None and end is None:
@@ -152,7 +173,7 @@ class DateRangeParser(TextParser):
     def __init__(self, calendar: str):
         super().__init__()
         self.calendar_name = calendar
-        self.calendar = Calendar() if calendar == "actual" else Calendar.load(calendar)
+        self.calendar = Calendar() if calendar == "actual" else load_calendar(calendar)
 
     def parse_year(self, text, match):
         r"^\d{4}$"
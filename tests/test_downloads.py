@@ -1,8 +1,25 @@
 
-from datetime import datetime
+from datetime import datetime, timedelta
+import gzip
+import io
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
 
 import pytest
-from brasa.engine import CacheMetadata, _download_marketdata
+from brasa.downloaders import downloaders
+from brasa.engine import (
+    CacheManager,
+    CacheMetadata,
+    MarketDataDownloader,
+    _download_marketdata,
+    download_marketdata,
+    download_templates,
+    retrieve_template,
+)
 
 
 def test_download_marketdata_missing_args_error():
@@ -75,3 +92,121 @@ def test_download_settlement_prices():
     meta = CacheMetadata("b3-futures-settlement-prices")
     _download_marketdata(meta, refdate=datetime(2023, 5, 10))
     assert len(meta.downloaded_files) == 1
+
+
+@pytest.fixture
+def temp_fname():
+    folder = f"brasa-test-{uuid.uuid4().hex}"
+    yield f"{folder}/file.txt"
+    shutil.rmtree(f"/tmp/{folder}", ignore_errors=True)
+
+
+def test_save_file_to_temp_folder_skips_unchanged_content(temp_fname):
+    path = f"/tmp/{temp_fname}"
+    assert downloaders.save_file_to_temp_folder({}, temp_fname, io.BytesIO(b"content")) is True
+    with open(f"{path}.hash") as f:
+        checksum = f.read()
+    mtime = os.stat(path).st_mtime_ns
+
+    assert downloaders.save_file_to_temp_folder({}, temp_fname, io.BytesIO(b"content")) is False
+    assert os.stat(path).st_mtime_ns == mtime
+
+    assert downloaders.save_file_to_temp_folder({}, temp_fname, io.BytesIO(b"new content")) is True
+    with open(path, "rb") as f:
+        assert f.read() == b"new content"
+    with open(f"{path}.hash") as f:
+        assert f.read() != checksum
+
+
+class FakeDownloader:
+    now = datetime(2023, 5, 10)
+
+    def __init__(self, fname, content):
+        self.fname = fname
+        self.content = content
+
+    def download(self, refdate=None):
+        return self.fname, io.BytesIO(self.content), 200, refdate
+
+
+def test_download_by_config_reports_unchanged_file(temp_fname, monkeypatch):
+    downloader = FakeDownloader(temp_fname, b"content")
+    monkeypatch.setattr(downloaders, "downloader_factory", lambda **config: downloader, raising=False)
+    config = b'{"output_bucket": "bucket", "name": "name"}'
+
+    res = downloaders.download_by_config(config, downloaders.save_file_to_temp_folder)
+    assert res["message"] == "File saved"
+    res = downloaders.download_by_config(config, downloaders.save_file_to_temp_folder)
+    assert res["message"] == "File unchanged"
+    assert res["status"] == 0
+
+    downloader.content = b"new content"
+    res = downloaders.download_by_config(config, downloaders.save_file_to_temp_folder)
+    assert res["message"] == "File saved"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("BRASA_DATA_PATH", str(tmp_path))
+    monkeypatch.setattr(CacheManager, "__it__", None, raising=False)
+    return CacheManager()
+
+
+def fake_zip_download(self, **kwargs):
+    # every date returns a zip file with the same member name, as the B3 files do
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("Premio.txt", f"{self.url}\n" + "0" * (1 << 20) + f"\n{kwargs['refdate']:%Y-%m-%d}\n")
+    buf.seek(0)
+    time.sleep(0.01)
+    return buf, None
+
+
+def check_downloaded_dates(cache, template_name, dates):
+    template = retrieve_template(template_name)
+    for refdate in dates:
+        meta = CacheMetadata(template.id)
+        meta.extra_key = template.downloader.extra_key
+        meta.download_args = {"refdate": refdate}
+        assert cache.has_meta(meta)
+        cache.load_meta(meta)
+        assert len(meta.downloaded_files) == 1
+        with gzip.open(cache.cache_path(meta.downloaded_files[0]), "rt") as f:
+            lines = f.read().split()
+        assert lines[0] == template.downloader.url
+        assert lines[-1] == f"{refdate:%Y-%m-%d}"
+
+
+def test_download_marketdata_concurrent_zip_files(cache, monkeypatch):
+    monkeypatch.setattr(MarketDataDownloader, "download", fake_zip_download)
+    dates = [datetime(2023, 1, 1) + timedelta(days=i) for i in range(48)]
+    download_marketdata("b3-equity-options", refdate=dates)
+    check_downloaded_dates(cache, "b3-equity-options", dates)
+
+
+def test_download_templates_concurrent_zip_files(cache, monkeypatch):
+    monkeypatch.setattr(MarketDataDownloader, "download", fake_zip_download)
+    dates = [datetime(2023, 1, 1) + timedelta(days=i) for i in range(24)]
+    templates = ["b3-equity-options", "b3-equities-volatility-surface"]
+    download_templates(templates, refdate=dates)
+    for template_name in templates:
+        check_downloaded_dates(cache, template_name, dates)
+
+
+def test_download_marketdata_stops_at_first_error(cache, monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def fail_first(self, meta):
+        with lock:
+            calls.append(meta)
+            first = len(calls) == 1
+        if first:
+            raise RuntimeError("download failed")
+        time.sleep(0.05)
+
+    monkeypatch.setattr(CacheManager, "download_marketdata", fail_first)
+    dates = [datetime(2023, 1, 1) + timedelta(days=i) for i in range(160)]
+    with pytest.raises(RuntimeError):
+        download_marketdata("b3-equity-options", refdate=dates)
+    assert len(calls) < len(dates)
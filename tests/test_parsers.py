@@ -0,0 +1,35 @@
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from brasa.parsers.b3 import COTAHISTParser, IndicParser
+
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def test_cotahist_parser() -> None:
+    parser = COTAHISTParser(os.path.join(DATA_PATH, "COTAHIST_D04012016.TXT"))
+    tables = parser._data._tables
+    assert tables["header"].shape == (1, 5)
+    assert tables["trailer"].shape == (1, 6)
+    df = tables["data"]
+    assert df.shape == (504, 26)
+    assert df["symbol"].iloc[0] == "AAPL34"
+    assert df["refdate"].iloc[0] == datetime(2016, 1, 4)
+    assert df["open"].iloc[0] == 41.5
+    assert df["corporation_name"].iloc[0] == "APPLE"
+    # the row properties return the parsed tables
+    assert parser.data is df
+    assert parser.header is tables["header"]
+    assert parser.trailer is tables["trailer"]
+    assert isinstance(parser.data, pd.DataFrame)
+
+
+def test_indic_parser() -> None:
+    parser = IndicParser(os.path.join(DATA_PATH, "Indic.txt"))
+    df = parser._tables["data"]
+    assert df.shape == (480, 9)
+    assert df["data_geracao_arquivo"].notna().all()
+    assert parser.data is df
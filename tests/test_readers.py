@@ -0,0 +1,143 @@
+from functools import lru_cache
+import glob
+import gzip
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from brasa.readers import helpers
+from brasa.readers.helpers import _parse_gzip_file, _read_bvbg086_file, _text_columns_args
+
+
+BVBG086_XML = """<?xml version="1.0" encoding="utf-8"?>
+<Document xmlns="urn:bvmf.052.01.xsd">
+  <BizFileHdr>
+    <Xchg>
+      <BizGrpDesc>
+        <BizGrpDtls>
+          <CreDtAndTm>2021-04-23T18:10:27</CreDtAndTm>
+        </BizGrpDtls>
+      </BizGrpDesc>
+      <BizGrp>
+        <Document xmlns="urn:bvmf.217.01.xsd">
+          <PricRpt>
+            <TradDt><Dt>2021-04-23</Dt></TradDt>
+            <SctyId><TckrSymb>{symbol}</TckrSymb></SctyId>
+            <FinInstrmId><OthrId><Id>100</Id><Tp><Prtry>8</Prtry></Tp></OthrId></FinInstrmId>
+            <TradDtls><TradQty>10</TradQty></TradDtls>
+            <FinInstrmAttrbts>
+              <LastPric>5.5</LastPric>
+              <AdjstdValCtrct>1,5</AdjstdValCtrct>
+            </FinInstrmAttrbts>
+          </PricRpt>
+        </Document>
+      </BizGrp>
+    </Xchg>
+  </BizFileHdr>
+</Document>
+"""
+
+
+def write_bvbg086(path: str, symbol: str) -> None:
+    with gzip.open(path, "wb") as f:
+        f.write(BVBG086_XML.format(symbol=symbol).encode("utf-8"))
+
+
+def sidecars(folder) -> list[str]:
+    return glob.glob(os.path.join(folder, "bvbg086_*.parquet"))
+
+
+def test_bvbg086_sidecar(tmp_path) -> None:
+    path = str(tmp_path / "PR210423.xml.gz")
+    write_bvbg086(path, "PETR4")
+    df = _read_bvbg086_file(path)
+    assert df["symbol"].iloc[0] == "PETR4"
+    assert df["close"].iloc[0] == 5.5
+    assert df["adjusted_value_contract"].iloc[0] == 1.5
+    assert df["refdate"].iloc[0] == pd.Timestamp("2021-04-23")
+    assert len(sidecars(tmp_path)) == 1
+    pd.testing.assert_frame_equal(_read_bvbg086_file(path), df)
+
+    # a new raw file invalidates the sidecar and replaces it
+    write_bvbg086(path, "VALE3")
+    os.utime(path, ns=(0, 0))
+    assert _read_bvbg086_file(path)["symbol"].iloc[0] == "VALE3"
+    assert len(sidecars(tmp_path)) == 1
+
+
+def test_bvbg086_corrupt_sidecar(tmp_path) -> None:
+    path = str(tmp_path / "PR210423.xml.gz")
+    write_bvbg086(path, "PETR4")
+    _read_bvbg086_file(path)
+    (sidecar,) = sidecars(tmp_path)
+    with open(sidecar, "wb") as f:
+        f.write(b"PAR1 truncated")
+    df = _read_bvbg086_file(path)
+    assert df["symbol"].iloc[0] == "PETR4"
+    pd.testing.assert_frame_equal(pd.read_parquet(sidecar), df)
+
+
+def test_text_columns_args_match_str_converters() -> None:
+    text = "refdate;symbol;trade_time\n2023-05-10;PETR4;\n;NA;NA\n2023-05-10;;093000\n"
+    names = ["refdate", "symbol", "trade_time"]
+    args = dict(sep=";", header=None, skiprows=1, names=names, dtype_backend="pyarrow")
+    expected = pd.read_csv(io.StringIO(text), converters={"trade_time": str}, **args)
+    df = pd.read_csv(io.StringIO(text), **args, **_text_columns_args(names, ["trade_time"]))
+    pd.testing.assert_frame_equal(df, expected)
+    assert df["trade_time"].tolist() == ["", "NA", "093000"]
+
+
+parsed_files = []
+
+
+def csv_parser(fp) -> pd.DataFrame:
+    parsed_files.append(fp)
+    return pd.read_csv(fp)
+
+
+@pytest.fixture
+def parse_cache(monkeypatch):
+    monkeypatch.setattr(helpers, "_PARSE_CACHE_SIZE", 2)
+    monkeypatch.setattr(helpers, "_cached_parse", lru_cache(maxsize=2)(helpers._parse_file))
+    parsed_files.clear()
+
+
+def write_csv(path: str, value: int) -> None:
+    with gzip.open(path, "wt") as f:
+        f.write(f"value\n{value}\n")
+
+
+def test_parse_cache(tmp_path, parse_cache) -> None:
+    path = str(tmp_path / "data.csv.gz")
+    write_csv(path, 1)
+    df = _parse_gzip_file(path, csv_parser)
+    assert df["value"].tolist() == [1]
+    # returned frames are copies, changing them doesn't change the cache
+    df.loc[0, "value"] = 10
+    assert _parse_gzip_file(path, csv_parser)["value"].tolist() == [1]
+    assert len(parsed_files) == 1
+
+    # a new modification time invalidates the cached tables
+    write_csv(path, 2)
+    os.utime(path, ns=(0, 0))
+    assert _parse_gzip_file(path, csv_parser)["value"].tolist() == [2]
+    assert len(parsed_files) == 2
+
+
+def test_parse_cache_disabled_by_default(tmp_path) -> None:
+    path = str(tmp_path / "data.csv.gz")
+    write_csv(path, 1)
+    parsed_files.clear()
+    _parse_gzip_file(path, csv_parser)
+    _parse_gzip_file(path, csv_parser)
+    assert len(parsed_files) == 2
+
+
+def test_parse_cache_size(monkeypatch) -> None:
+    monkeypatch.setenv("BRASA_PARSE_CACHE_SIZE", "4")
+    assert helpers._parse_cache_size() == 4
+    monkeypatch.setenv("BRASA_PARSE_CACHE_SIZE", "many")
+    with pytest.warns(UserWarning):
+        assert helpers._parse_cache_size() == 0